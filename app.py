@@ -54,6 +54,9 @@ content_handler.router.message.middleware(AlbumMiddleware())
 
 # ===== ALBUM PROCESSING =====
 
+# Ссылки на фоновые задачи сбора альбомов — иначе их может собрать GC
+_album_tasks: set = set()
+
 async def _process_album_delayed(media_group_id: str):
     """
     Фоновая задача: ждёт сбора всех сообщений альбома,
@@ -87,6 +90,7 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 Starting Публикатор ИИ...")
     await init_db()
+    await UserManager.listen_changes()
 
     webhook_url = f"{config.APP_URL}{config.WEBHOOK_PATH}"
     await bot.set_webhook(
@@ -100,6 +104,7 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     await bot.delete_webhook()
+    await UserManager.flush_pending_debits()
     await close_db()
     await bot.session.close()
     logger.info("👋 Shutdown complete")
@@ -128,7 +133,9 @@ async def webhook(request: Request):
 
         if is_first:
             # Запускаем отложенную обработку (только для первого сообщения группы)
-            asyncio.create_task(_process_album_delayed(group_id))
+            task = asyncio.create_task(_process_album_delayed(group_id))
+            _album_tasks.add(task)
+            task.add_done_callback(_album_tasks.discard)
 
         # Мгновенный ответ Telegram — не блокируем webhook
         return Response(status_code=200)
@@ -175,14 +182,12 @@ async def robokassa_result(request: Request):
     from database.db import get_pool
     pool = await get_pool()
     async with pool.acquire() as conn:
-        user = await conn.fetchrow("SELECT * FROM users WHERE id = $1", payment["user_id"])
+        chat_id = await conn.fetchval("SELECT chat_id FROM users WHERE id = $1", payment["user_id"])
 
-    if not user:
+    if not chat_id:
         logger.error("❌ User not found for payment", user_id=payment["user_id"])
         return Response(content=f"OK{inv_id}", status_code=200)
 
-    chat_id = user["chat_id"]
-
     # Обрабатываем тип платежа
     if payment["payment_type"] == "subscription":
         await UserManager.activate_subscription(chat_id)
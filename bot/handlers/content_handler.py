@@ -1,10 +1,9 @@
 """Хэндлер создания, рерайта, редактирования и публикации контента"""
 
-import json
 import structlog
 from typing import Optional, Dict, Any, List
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, InputMediaPhoto, InputMediaVideo
+from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
 from database.managers.user_manager import UserManager
@@ -15,18 +14,15 @@ from bot.states.states import ContentGeneration, RewritePost
 from bot.keyboards.keyboards import post_actions_kb, main_menu_kb, cancel_kb
 from services import openai_service
 from services.whisper_service import transcribe_voice
-from services.channel_service import publish_post
+from services.channel_service import (
+    publish_post, send_long_text, send_single_media, build_media_group, SEND_METHODS,
+)
 from utils.media import extract_media_info, extract_links, get_text
 from utils.html_sanitizer import sanitize_html
 
 logger = structlog.get_logger()
 router = Router()
 
-# Telegram ограничивает caption медиа до 1024 символов
-CAPTION_MAX_LENGTH = 1024
-# Telegram ограничивает текстовые сообщения до 4096 символов
-MESSAGE_MAX_LENGTH = 4096
-
 
 # ============================================================
 #  MIDDLEWARE-ПРОВЕРКИ
@@ -40,12 +36,11 @@ async def _check_prerequisites(message_or_cb, state: FSMContext):
     if not user:
         return None, "Сначала нажмите /start"
 
-    has_access = await UserManager.has_access(chat_id)
-    if not has_access:
+    # Доступ и баланс проверяем по той же строке — без повторных SELECT
+    if not UserManager.check_access(user):
         return None, "⚠️ Нет активной подписки. Оформите подписку в разделе 💳 Подписка."
 
-    has_tokens = await UserManager.has_tokens(chat_id)
-    if not has_tokens:
+    if user["tokens_balance"] <= 0:
         return None, "⚠️ Закончились токены. Докупите токены в разделе 💳 Подписка."
 
     agent = await AgentManager.get_agent(user["id"])
@@ -77,49 +72,6 @@ async def _get_text_or_transcribe(message: Message, bot: Bot) -> Optional[str]:
 #  УТИЛИТЫ ДЛЯ ОТПРАВКИ
 # ============================================================
 
-async def _send_long_text(
-    bot: Bot,
-    chat_id: int,
-    text: str,
-    reply_markup=None,
-    parse_mode: str = "HTML",
-) -> Optional[Message]:
-    """
-    Отправка длинного текста с разбиением на части (если > 4096 символов).
-    reply_markup прикрепляется только к последнему сообщению.
-    """
-    # Санитизация HTML перед отправкой
-    if parse_mode == "HTML":
-        text = sanitize_html(text)
-
-    if len(text) <= MESSAGE_MAX_LENGTH:
-        return await bot.send_message(
-            chat_id, text, reply_markup=reply_markup, parse_mode=parse_mode,
-        )
-
-    # Разбиваем на части
-    parts = []
-    while text:
-        if len(text) <= MESSAGE_MAX_LENGTH:
-            parts.append(text)
-            break
-        cut_pos = text.rfind("\n", 0, MESSAGE_MAX_LENGTH)
-        if cut_pos <= 0:
-            cut_pos = MESSAGE_MAX_LENGTH
-        parts.append(text[:cut_pos])
-        text = text[cut_pos:].lstrip("\n")
-
-    last_msg = None
-    for i, part in enumerate(parts):
-        is_last = (i == len(parts) - 1)
-        last_msg = await bot.send_message(
-            chat_id, part,
-            reply_markup=reply_markup if is_last else None,
-            parse_mode=parse_mode,
-        )
-    return last_msg
-
-
 async def _send_post_preview(
     bot: Bot,
     chat_id: int,
@@ -140,7 +92,7 @@ async def _send_post_preview(
 
     # Без медиа — просто текст
     if not media_info:
-        return await _send_long_text(bot, chat_id, full_caption, reply_markup=reply_markup)
+        return await send_long_text(bot, chat_id, full_caption, reply_markup=reply_markup)
 
     media_type = media_info.get("type")
 
@@ -148,26 +100,14 @@ async def _send_post_preview(
     if media_type == "album":
         items = media_info.get("items", [])
         if items:
-            media_group = []
-            use_caption = len(full_caption) <= CAPTION_MAX_LENGTH
-
-            for i, item in enumerate(items):
-                file_id = item["file_id"]
-                item_type = item.get("type", "photo")
-                cap = full_caption if (i == 0 and use_caption) else None
-                parse = "HTML" if cap else None
-
-                if item_type == "photo":
-                    media_group.append(InputMediaPhoto(media=file_id, caption=cap, parse_mode=parse))
-                elif item_type == "video":
-                    media_group.append(InputMediaVideo(media=file_id, caption=cap, parse_mode=parse))
+            media_group, use_caption = build_media_group(items, full_caption)
 
             if media_group:
                 await bot.send_media_group(chat_id, media_group)
 
                 # Если caption не влез в медиа — текст отдельно
                 if not use_caption:
-                    await _send_long_text(bot, chat_id, full_caption)
+                    await send_long_text(bot, chat_id, full_caption)
 
                 if reply_markup:
                     return await bot.send_message(
@@ -177,32 +117,11 @@ async def _send_post_preview(
                 return None
 
     # === ОДИНОЧНЫЕ МЕДИА ===
-    send_methods = {
-        "photo": ("send_photo", "photo"),
-        "video": ("send_video", "video"),
-        "animation": ("send_animation", "animation"),
-        "document": ("send_document", "document"),
-    }
-
-    if media_type in send_methods:
-        method_name, param_name = send_methods[media_type]
-        method = getattr(bot, method_name)
-
-        if len(full_caption) <= CAPTION_MAX_LENGTH:
-            return await method(
-                chat_id,
-                **{param_name: media_info["file_id"]},
-                caption=full_caption,
-                reply_markup=reply_markup,
-                parse_mode="HTML",
-            )
-        else:
-            # Медиа без подписи + текст отдельно
-            await method(chat_id, **{param_name: media_info["file_id"]})
-            return await _send_long_text(bot, chat_id, full_caption, reply_markup=reply_markup)
+    if media_type in SEND_METHODS:
+        return await send_single_media(bot, chat_id, full_caption, media_info, reply_markup=reply_markup)
 
     # Fallback — текстом
-    return await _send_long_text(bot, chat_id, full_caption, reply_markup=reply_markup)
+    return await send_long_text(bot, chat_id, full_caption, reply_markup=reply_markup)
 
 
 def _collect_album_media(album: List[Message]) -> Dict[str, Any]:
@@ -224,15 +143,6 @@ def _collect_album_media(album: List[Message]) -> Dict[str, Any]:
     }
 
 
-def _parse_media_info(media_info) -> Optional[Dict[str, Any]]:
-    """Парсинг media_info из БД (может быть строкой или dict)"""
-    if not media_info:
-        return None
-    if isinstance(media_info, str):
-        return json.loads(media_info)
-    return media_info
-
-
 # ============================================================
 #  1. СОЗДАНИЕ ПОСТА
 # ============================================================
@@ -291,7 +201,7 @@ async def create_post_generate(message: Message, state: FSMContext, bot: Bot):
         return
 
     total_tokens = result["total_tokens"]
-    await UserManager.spend_tokens(message.from_user.id, total_tokens)
+    UserManager.spend_tokens_later(message.from_user.id, total_tokens)
 
     conversation_history = [
         {"role": "user", "content": prompt},
@@ -382,7 +292,7 @@ async def rewrite_post_voice(message: Message, state: FSMContext, bot: Bot):
         return
 
     total_tokens = result["total_tokens"]
-    await UserManager.spend_tokens(message.from_user.id, total_tokens)
+    UserManager.spend_tokens_later(message.from_user.id, total_tokens)
 
     conversation_history = [
         {"role": "user", "content": f"Перепиши пост:\n{original_text}"},
@@ -469,7 +379,7 @@ async def rewrite_post_received(message: Message, state: FSMContext, bot: Bot, a
         return
 
     total_tokens = result["total_tokens"]
-    await UserManager.spend_tokens(message.from_user.id, total_tokens)
+    UserManager.spend_tokens_later(message.from_user.id, total_tokens)
 
     conversation_history = [
         {"role": "user", "content": f"Перепиши пост:\n{original_text}"},
@@ -568,9 +478,7 @@ async def edit_post_process(message: Message, state: FSMContext, bot: Bot):
             return
         status_msg = await message.answer("⏳ Редактирую...")
 
-    conversation_history = post.get("conversation_history") or []
-    if isinstance(conversation_history, str):
-        conversation_history = json.loads(conversation_history)
+    conversation_history = post["conversation_history"] or []
 
     result = await openai_service.edit_content(
         current_text=post["final_text"] or post["generated_text"],
@@ -585,10 +493,12 @@ async def edit_post_process(message: Message, state: FSMContext, bot: Bot):
         return
 
     total_tokens = result["total_tokens"]
-    await UserManager.spend_tokens(message.from_user.id, total_tokens)
+    UserManager.spend_tokens_later(message.from_user.id, total_tokens)
 
     conversation_history.append({"role": "user", "content": edit_instruction})
     conversation_history.append({"role": "assistant", "content": result["text"]})
+    # Дальше окна модели историю не храним
+    conversation_history = conversation_history[-openai_service.MAX_HISTORY_TURNS * 2:]
 
     await PostManager.update_post_text(
         post_id=post_id,
@@ -606,7 +516,7 @@ async def edit_post_process(message: Message, state: FSMContext, bot: Bot):
     except Exception:
         pass
 
-    media_info = _parse_media_info(post.get("media_info"))
+    media_info = post["media_info"]
 
     await _send_post_preview(
         bot=bot,
@@ -643,8 +553,7 @@ async def regenerate_post(callback: CallbackQuery, state: FSMContext, bot: Bot):
         await callback.message.answer("⚠️ Агент не найден.")
         return
 
-    has_tokens = await UserManager.has_tokens(callback.from_user.id)
-    if not has_tokens:
+    if user["tokens_balance"] <= 0:
         await callback.message.answer("⚠️ Закончились токены.")
         return
 
@@ -670,7 +579,7 @@ async def regenerate_post(callback: CallbackQuery, state: FSMContext, bot: Bot):
         return
 
     total_tokens = result["total_tokens"]
-    await UserManager.spend_tokens(callback.from_user.id, total_tokens)
+    UserManager.spend_tokens_later(callback.from_user.id, total_tokens)
 
     conversation_history = [
         {"role": "user", "content": original_text},
@@ -690,7 +599,7 @@ async def regenerate_post(callback: CallbackQuery, state: FSMContext, bot: Bot):
     except Exception:
         pass
 
-    media_info = _parse_media_info(post.get("media_info"))
+    media_info = post["media_info"]
 
     await _send_post_preview(
         bot=bot,
@@ -730,7 +639,7 @@ async def publish_post_handler(callback: CallbackQuery, state: FSMContext, bot:
         return
 
     text_to_publish = post["final_text"] or post["generated_text"]
-    media_info = _parse_media_info(post.get("media_info"))
+    media_info = post["media_info"]
 
     status_msg = await callback.message.answer("⏳ Публикую в канал...")
 
@@ -48,14 +48,14 @@ async def pay_subscription(callback: CallbackQuery):
     
     amount = config.SUBSCRIPTION_PRICE_RUB
     
-    payment = await PaymentManager.create_payment(
+    payment_id = await PaymentManager.create_payment(
         user_id=user["id"],
         amount_rub=amount,
         payment_type="subscription",
     )
     
     url = PaymentManager.generate_robokassa_url(
-        inv_id=payment["id"],
+        inv_id=payment_id,
         amount_rub=amount,
         description="Публикатор ИИ — подписка 1 мес",
     )
@@ -81,7 +81,7 @@ async def pay_tokens(callback: CallbackQuery):
         await callback.message.answer("❌ Неизвестный пакет токенов.")
         return
     
-    payment = await PaymentManager.create_payment(
+    payment_id = await PaymentManager.create_payment(
         user_id=user["id"],
         amount_rub=amount_rub,
         payment_type="tokens",
@@ -89,7 +89,7 @@ async def pay_tokens(callback: CallbackQuery):
     )
     
     url = PaymentManager.generate_robokassa_url(
-        inv_id=payment["id"],
+        inv_id=payment_id,
         amount_rub=amount_rub,
         description=f"Публикатор ИИ — {tokens_amount:,} токенов",
     )
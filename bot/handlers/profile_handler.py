@@ -20,7 +20,7 @@ async def profile(message: Message, state: FSMContext):
         await message.answer("Сначала нажмите /start")
         return
     
-    access = await UserManager.get_access_info(message.from_user.id)
+    access = UserManager.build_access_info(user)
     
     # Статус доступа — подписка приоритетнее триала
     if access["subscription_active"]:
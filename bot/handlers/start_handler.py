@@ -22,7 +22,7 @@ async def cmd_start(message: Message, state: FSMContext):
         first_name=message.from_user.first_name,
     )
     
-    access = await UserManager.get_access_info(message.from_user.id)
+    access = UserManager.build_access_info(user)
     
     if access["subscription_active"]:
         access_text = f"💳 Подписка активна: {access['subscription_days_left']} дн."
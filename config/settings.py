@@ -13,10 +13,16 @@ class Config:
 
     # Database
     DATABASE_URL = os.getenv("DATABASE_URL", "")
+    # Реплика для чистых чтений (необязательно)
+    DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "")
 
     # OpenAI
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL = "gpt-4o-mini"
+    # Потолок ответа: резервируется в TPM-лимите на каждый запрос
+    OPENAI_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "2000"))
+    # Одновременных запросов к OpenAI на процесс
+    OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "20"))
 
     # Robokassa
     ROBOKASSA_LOGIN = os.getenv("ROBOKASSA_LOGIN", "")
@@ -33,6 +39,7 @@ class Config:
     TRIAL_DAYS = int(os.getenv("TRIAL_DAYS", "3"))
     SUBSCRIPTION_PRICE_RUB = int(os.getenv("SUBSCRIPTION_PRICE_RUB", "10"))
     DEFAULT_TOKEN_LIMIT = int(os.getenv("DEFAULT_TOKEN_LIMIT", "100000"))
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
 
     # Token packages (tokens: price_rub)
     TOKEN_PACKAGES = {
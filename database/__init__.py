@@ -1 +1 @@
-from database.db import init_db, get_pool, close_db
+from database.db import init_db, get_pool, get_read_pool, add_listener, close_db
@@ -1,21 +1,53 @@
 """Database connection pool"""
 
+import asyncio
 import asyncpg
+import orjson
 import structlog
 from config.settings import config
 
 logger = structlog.get_logger()
 
 pool: asyncpg.Pool = None
+replica_pool: asyncpg.Pool = None
+# Отдельное соединение под LISTEN — из пула его брать нельзя
+listener_conn: asyncpg.Connection = None
+# Подписки (channel, callback, on_lost) — переподписываемся после обрыва
+_listeners: list = []
+_reconnect_task: asyncio.Task = None
+
+async def _init_connection(conn: asyncpg.Connection):
+    """Init-хук пула: JSONB-кодек"""
+    # JSONB приходит из драйвера сразу dict/list — без json.loads в менеджерах
+    await conn.set_type_codec(
+        "jsonb",
+        encoder=lambda value: orjson.dumps(value).decode(),
+        decoder=orjson.loads,
+        schema="pg_catalog",
+    )
+
+
+async def _create_pool(dsn: str) -> asyncpg.Pool:
+    return await asyncpg.create_pool(
+        dsn,
+        min_size=2,
+        max_size=10,
+        init=_init_connection,
+        statement_cache_size=256,
+    )
 
 
 async def init_db():
-    """Initialize database connection pool and create tables"""
-    global pool
-    pool = await asyncpg.create_pool(config.DATABASE_URL, min_size=2, max_size=10)
+    """Initialize database connection pools and create tables"""
+    global pool, replica_pool
+    pool = await _create_pool(config.DATABASE_URL)
     logger.info("✅ Database pool created")
     await _create_tables()
 
+    if config.DATABASE_REPLICA_URL:
+        replica_pool = await _create_pool(config.DATABASE_REPLICA_URL)
+        logger.info("✅ Replica pool created")
+
 
 async def get_pool() -> asyncpg.Pool:
     global pool
@@ -24,8 +56,77 @@ async def get_pool() -> asyncpg.Pool:
     return pool
 
 
+async def get_read_pool() -> asyncpg.Pool:
+    """Пул для чистых чтений: реплика, если настроена, иначе основной"""
+    primary = await get_pool()
+    return replica_pool or primary
+
+
+async def add_listener(channel: str, callback, on_lost=None):
+    """
+    Подписаться на NOTIFY канала (callback(conn, pid, channel, payload)).
+    on_lost() вызывается при обрыве соединения и после переподключения —
+    пока соединения нет, уведомления теряются.
+    """
+    global listener_conn
+    _listeners.append((channel, callback, on_lost))
+    if listener_conn is None:
+        listener_conn = await _connect_listener()
+    else:
+        await listener_conn.add_listener(channel, callback)
+
+
+async def _connect_listener() -> asyncpg.Connection:
+    conn = await asyncpg.connect(config.DATABASE_URL)
+    for channel, callback, _ in _listeners:
+        await conn.add_listener(channel, callback)
+    conn.add_termination_listener(_on_listener_terminated)
+    return conn
+
+
+def _notify_lost():
+    for _, _, on_lost in _listeners:
+        if on_lost:
+            on_lost()
+
+
+def _on_listener_terminated(conn):
+    global _reconnect_task
+    # close_db сначала обнуляет listener_conn — штатное закрытие не переподключаем
+    if conn is not listener_conn:
+        return
+    logger.warning("⚠️ LISTEN connection lost, reconnecting")
+    _notify_lost()
+    _reconnect_task = asyncio.create_task(_reconnect_listener())
+
+
+async def _reconnect_listener():
+    global listener_conn
+    delay = 1
+    while True:
+        try:
+            listener_conn = await _connect_listener()
+            break
+        except Exception as e:
+            logger.error("❌ LISTEN reconnect failed", error=str(e), retry_in=delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+    # За время обрыва в кэш могли попасть строки, изменённые другими воркерами
+    _notify_lost()
+    logger.info("✅ LISTEN connection restored")
+
+
 async def close_db():
-    global pool
+    global pool, replica_pool, listener_conn
+    if _reconnect_task:
+        _reconnect_task.cancel()
+    if listener_conn:
+        conn, listener_conn = listener_conn, None
+        await conn.close()
+    _listeners.clear()
+    if replica_pool:
+        await replica_pool.close()
+        replica_pool = None
     if pool:
         await pool.close()
         pool = None
@@ -145,14 +246,42 @@ async def _create_tables():
         );
         
         -- Индексы
-        CREATE INDEX IF NOT EXISTS idx_users_chat_id ON users(chat_id);
-        CREATE INDEX IF NOT EXISTS idx_channels_user_id ON channels(user_id);
-        CREATE INDEX IF NOT EXISTS idx_agents_user_id ON agents(user_id);
         CREATE INDEX IF NOT EXISTS idx_posts_user_id ON posts(user_id);
         CREATE INDEX IF NOT EXISTS idx_posts_status ON posts(status);
         CREATE INDEX IF NOT EXISTS idx_payments_user_id ON payments(user_id);
         CREATE INDEX IF NOT EXISTS idx_payments_status ON payments(status);
         CREATE INDEX IF NOT EXISTS idx_token_usage_user_id ON token_usage(user_id);
         
+        -- Дубли индексов от UNIQUE(chat_id) / UNIQUE(user_id) — только замедляют запись
+        DROP INDEX IF EXISTS idx_users_chat_id;
+        DROP INDEX IF EXISTS idx_channels_user_id;
+        DROP INDEX IF EXISTS idx_agents_user_id;
+        
+        -- Оповещение воркеров об изменении пользователя (сброс кэша)
+        CREATE OR REPLACE FUNCTION notify_user_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('users_changed', NEW.chat_id::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        
+        -- Без DROP: пересоздание триггера берёт блокировку users на каждом старте
+        -- и гоняется между воркерами
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_trigger
+                WHERE tgname = 'trg_users_changed' AND tgrelid = 'users'::regclass
+            ) THEN
+                CREATE TRIGGER trg_users_changed AFTER UPDATE ON users
+                    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+                    EXECUTE FUNCTION notify_user_changed();
+            END IF;
+        EXCEPTION WHEN duplicate_object THEN
+            -- Параллельный воркер успел создать его первым
+            NULL;
+        END;
+        $$;
+        
         """)
         logger.info("✅ Database tables created/verified")
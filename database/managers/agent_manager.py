@@ -1,7 +1,8 @@
 """Менеджер ИИ-агентов"""
 
 import structlog
-from typing import Optional, Dict, Any
+from typing import Optional
+from asyncpg import Record
 from database.db import get_pool
 
 logger = structlog.get_logger()
@@ -10,7 +11,7 @@ logger = structlog.get_logger()
 class AgentManager:
 
     @staticmethod
-    async def create_or_update(user_id: int, agent_name: str, instructions: str, model: str = "gpt-4o-mini") -> Dict[str, Any]:
+    async def create_or_update(user_id: int, agent_name: str, instructions: str, model: str = "gpt-4o-mini") -> Record:
         """Создать или обновить агента (один на пользователя)"""
         pool = await get_pool()
         async with pool.acquire() as conn:
@@ -23,17 +24,17 @@ class AgentManager:
             """, user_id, agent_name, instructions, model)
 
             logger.info("🤖 Agent created/updated", user_id=user_id, name=agent_name)
-            return dict(row)
+            return row
 
     @staticmethod
-    async def get_agent(user_id: int) -> Optional[Dict[str, Any]]:
+    async def get_agent(user_id: int) -> Optional[Record]:
         """Получить агента пользователя"""
         pool = await get_pool()
         async with pool.acquire() as conn:
             row = await conn.fetchrow(
                 "SELECT * FROM agents WHERE user_id = $1 AND is_active = TRUE", user_id
             )
-            return dict(row) if row else None
+            return row
 
     @staticmethod
     async def delete_agent(user_id: int) -> bool:
@@ -41,7 +42,7 @@ class AgentManager:
         pool = await get_pool()
         async with pool.acquire() as conn:
             result = await conn.execute("DELETE FROM agents WHERE user_id = $1", user_id)
-            success = result.split()[-1] != "0"
+            success = result != "DELETE 0"
             if success:
                 logger.info("🗑️ Agent deleted", user_id=user_id)
             return success
@@ -1,7 +1,8 @@
 """Менеджер каналов"""
 
 import structlog
-from typing import Optional, Dict, Any
+from typing import Optional
+from asyncpg import Record
 from database.db import get_pool
 
 logger = structlog.get_logger()
@@ -10,7 +11,7 @@ logger = structlog.get_logger()
 class ChannelManager:
 
     @staticmethod
-    async def link_channel(user_id: int, channel_id: int, title: str = None, username: str = None) -> Dict[str, Any]:
+    async def link_channel(user_id: int, channel_id: int, title: str = None, username: str = None) -> Record:
         """Привязать канал (заменяет предыдущий)"""
         pool = await get_pool()
         async with pool.acquire() as conn:
@@ -24,17 +25,17 @@ class ChannelManager:
             """, user_id, channel_id, title, username)
 
             logger.info("📢 Channel linked", user_id=user_id, channel_id=channel_id, title=title)
-            return dict(row)
+            return row
 
     @staticmethod
-    async def get_channel(user_id: int) -> Optional[Dict[str, Any]]:
+    async def get_channel(user_id: int) -> Optional[Record]:
         """Получить привязанный канал"""
         pool = await get_pool()
         async with pool.acquire() as conn:
             row = await conn.fetchrow(
                 "SELECT * FROM channels WHERE user_id = $1 AND is_active = TRUE", user_id
             )
-            return dict(row) if row else None
+            return row
 
     @staticmethod
     async def unlink_channel(user_id: int) -> bool:
@@ -44,7 +45,7 @@ class ChannelManager:
             result = await conn.execute(
                 "DELETE FROM channels WHERE user_id = $1", user_id
             )
-            success = result.split()[-1] != "0"
+            success = result != "DELETE 0"
             if success:
                 logger.info("🔗 Channel unlinked", user_id=user_id)
             return success
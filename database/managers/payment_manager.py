@@ -1,78 +1,82 @@
 """Менеджер платежей (Robokassa)"""
 
-import json
 import hashlib
+import hmac
 import structlog
 from urllib.parse import quote
-from typing import Optional, Dict, Any
+from typing import Optional
+from asyncpg import Record
 from database.db import get_pool
 from config.settings import config
 
 logger = structlog.get_logger()
 
+# Постоянные части подписей Robokassa — кодируем один раз при импорте
+# Логин для URL берём из того же снимка, что и для подписи
+_LOGIN = config.ROBOKASSA_LOGIN
+_LOGIN_BYTES = _LOGIN.encode()
+_PASSWORD1_BYTES = config.ROBOKASSA_PASSWORD1.encode()
+_PASSWORD2_BYTES = config.ROBOKASSA_PASSWORD2.encode()
+
 
 class PaymentManager:
 
     @staticmethod
-    async def create_payment(user_id: int, amount_rub: int, payment_type: str, tokens_amount: int = 0) -> Dict[str, Any]:
-        """Создать запись о платеже"""
+    async def create_payment(user_id: int, amount_rub: int, payment_type: str, tokens_amount: int = 0) -> int:
+        """Создать запись о платеже, вернуть её id (он же InvId в Robokassa)"""
         pool = await get_pool()
         async with pool.acquire() as conn:
-            row = await conn.fetchrow("""
+            payment_id = await conn.fetchval("""
                 INSERT INTO payments (user_id, amount_rub, payment_type, tokens_amount)
                 VALUES ($1, $2, $3, $4)
-                RETURNING *
+                RETURNING id
             """, user_id, amount_rub, payment_type, tokens_amount)
             logger.info("💰 Payment created", user_id=user_id, amount=amount_rub, type=payment_type)
-            return dict(row)
+            return payment_id
 
     @staticmethod
-    async def confirm_payment(inv_id: int, robokassa_data: dict = None) -> Optional[Dict[str, Any]]:
+    async def confirm_payment(inv_id: int, robokassa_data: dict = None) -> Optional[Record]:
         """Подтвердить платёж"""
         pool = await get_pool()
         async with pool.acquire() as conn:
-            # asyncpg требует JSON-строку для JSONB полей
-            robokassa_json = json.dumps(robokassa_data) if robokassa_data else None
             row = await conn.fetchrow("""
                 UPDATE payments SET status = 'success', robokassa_data = $2, updated_at = NOW()
                 WHERE id = $1 AND status = 'pending'
                 RETURNING *
-            """, inv_id, robokassa_json)
+            """, inv_id, robokassa_data or None)
             if row:
                 logger.info("✅ Payment confirmed", inv_id=inv_id)
-                return dict(row)
-            return None
+            return row
 
     @staticmethod
-    async def get_payment(payment_id: int) -> Optional[Dict[str, Any]]:
+    async def get_payment(payment_id: int) -> Optional[Record]:
         pool = await get_pool()
         async with pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM payments WHERE id = $1", payment_id)
-            return dict(row) if row else None
+            return await conn.fetchrow("SELECT * FROM payments WHERE id = $1", payment_id)
 
     @staticmethod
     def generate_robokassa_url(inv_id: int, amount_rub: int, description: str) -> str:
         """Генерация URL для оплаты через Robokassa"""
-        login = config.ROBOKASSA_LOGIN
-        password1 = config.ROBOKASSA_PASSWORD1
         is_test = config.ROBOKASSA_TEST_MODE
 
-        if not login:
+        if not _LOGIN_BYTES:
             logger.error("❌ ROBOKASSA_LOGIN is empty! Check environment variables.")
 
         # OutSum в формате с копейками
         out_sum = f"{amount_rub:.2f}"
 
         # Подпись: login:OutSum:InvId:Password1
-        signature_str = f"{login}:{out_sum}:{inv_id}:{password1}"
-        signature = hashlib.md5(signature_str.encode()).hexdigest()
+        signature = hashlib.md5(
+            b":".join((_LOGIN_BYTES, out_sum.encode(), str(inv_id).encode(), _PASSWORD1_BYTES)),
+            usedforsecurity=False,
+        ).hexdigest()
 
         # URL-encode описание
         encoded_desc = quote(description, safe="")
 
         base_url = "https://auth.robokassa.ru/Merchant/Index.aspx"
         params = (
-            f"MerchantLogin={login}"
+            f"MerchantLogin={_LOGIN}"
             f"&OutSum={out_sum}"
             f"&InvId={inv_id}"
             f"&Description={encoded_desc}"
@@ -85,12 +89,20 @@ class PaymentManager:
         url = f"{base_url}?{params}"
         logger.info("💳 Robokassa URL generated",
                      inv_id=inv_id, amount=out_sum, is_test=is_test,
-                     has_login=bool(login))
+                     has_login=bool(_LOGIN_BYTES))
         return url
 
     @staticmethod
     def verify_robokassa_signature(out_sum: str, inv_id: str, signature: str, password2: str = None) -> bool:
         """Проверка подписи от Robokassa (Result URL)"""
-        pwd = password2 or config.ROBOKASSA_PASSWORD2
-        expected = hashlib.md5(f"{out_sum}:{inv_id}:{pwd}".encode()).hexdigest().upper()
-        return signature.upper() == expected
+        pwd = password2.encode() if password2 else _PASSWORD2_BYTES
+        expected = hashlib.md5(
+            b":".join((out_sum.encode(), inv_id.encode(), pwd)),
+            usedforsecurity=False,
+        ).digest()
+        # Сравниваем байты дайджеста за постоянное время (регистр hex не важен)
+        try:
+            provided = bytes.fromhex(signature)
+        except ValueError:
+            return False
+        return hmac.compare_digest(expected, provided)
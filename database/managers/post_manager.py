@@ -1,9 +1,9 @@
 """Менеджер постов"""
 
-import json
 import structlog
-from typing import Optional, Dict, Any, List
-from database.db import get_pool
+from typing import Optional
+from asyncpg import Record
+from database.db import get_pool, get_read_pool
 
 logger = structlog.get_logger()
 
@@ -19,7 +19,7 @@ class PostManager:
         input_tokens: int = 0,
         output_tokens: int = 0,
         conversation_history: list = None
-    ) -> Dict[str, Any]:
+    ) -> Record:
         """Создать новый пост (draft)"""
         pool = await get_pool()
         async with pool.acquire() as conn:
@@ -32,48 +32,22 @@ class PostManager:
                 user_id,
                 original_text,
                 generated_text,
-                json.dumps(media_info) if media_info else None,
+                media_info or None,
                 input_tokens,
                 output_tokens,
-                json.dumps(conversation_history or [])
+                conversation_history or []
             )
 
             logger.info("📝 Post created", user_id=user_id, post_id=row["id"])
-            return dict(row)
+            return row
 
     @staticmethod
-    async def get_post(post_id: int) -> Optional[Dict[str, Any]]:
+    async def get_post(post_id: int) -> Optional[Record]:
+        # Только основная БД: пост читают перед правкой, с реплики пришёл бы старый текст
         pool = await get_pool()
         async with pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM posts WHERE id = $1", post_id)
-            if row:
-                result = dict(row)
-                # Parse JSON fields
-                if result.get("media_info") and isinstance(result["media_info"], str):
-                    result["media_info"] = json.loads(result["media_info"])
-                if result.get("conversation_history") and isinstance(result["conversation_history"], str):
-                    result["conversation_history"] = json.loads(result["conversation_history"])
-                return result
-            return None
-
-    @staticmethod
-    async def get_user_draft(user_id: int) -> Optional[Dict[str, Any]]:
-        """Получить текущий черновик пользователя"""
-        pool = await get_pool()
-        async with pool.acquire() as conn:
-            row = await conn.fetchrow("""
-                SELECT * FROM posts 
-                WHERE user_id = $1 AND status IN ('draft', 'editing')
-                ORDER BY created_at DESC LIMIT 1
-            """, user_id)
-            if row:
-                result = dict(row)
-                if result.get("media_info") and isinstance(result["media_info"], str):
-                    result["media_info"] = json.loads(result["media_info"])
-                if result.get("conversation_history") and isinstance(result["conversation_history"], str):
-                    result["conversation_history"] = json.loads(result["conversation_history"])
-                return result
-            return None
+            # media_info / conversation_history декодирует JSONB-кодек соединения
+            return await conn.fetchrow("SELECT * FROM posts WHERE id = $1", post_id)
 
     @staticmethod
     async def update_post_text(
@@ -86,35 +60,37 @@ class PostManager:
         """Обновить текст поста (при редактировании)"""
         pool = await get_pool()
         async with pool.acquire() as conn:
-            result = await conn.execute("""
-                UPDATE posts 
-                SET final_text = $2, 
-                    input_tokens = input_tokens + $3, 
+            updated_id = await conn.fetchval("""
+                UPDATE posts
+                SET final_text = $2,
+                    input_tokens = input_tokens + $3,
                     output_tokens = output_tokens + $4,
                     conversation_history = $5,
                     status = 'editing',
                     updated_at = NOW()
                 WHERE id = $1
+                RETURNING id
             """,
                 post_id,
                 new_text,
                 input_tokens,
                 output_tokens,
-                json.dumps(conversation_history) if conversation_history else '[]'
+                conversation_history or []
             )
-            return result.split()[-1] != "0"
+            return updated_id is not None
 
     @staticmethod
     async def mark_published(post_id: int, channel_id: int) -> bool:
         """Отметить пост как опубликованный"""
         pool = await get_pool()
         async with pool.acquire() as conn:
-            result = await conn.execute("""
-                UPDATE posts 
+            updated_id = await conn.fetchval("""
+                UPDATE posts
                 SET status = 'published', channel_id = $2, published_at = NOW(), updated_at = NOW()
                 WHERE id = $1
+                RETURNING id
             """, post_id, channel_id)
-            success = result.split()[-1] != "0"
+            success = updated_id is not None
             if success:
                 logger.info("📢 Post published", post_id=post_id, channel_id=channel_id)
             return success
@@ -124,15 +100,15 @@ class PostManager:
         """Удалить черновик"""
         pool = await get_pool()
         async with pool.acquire() as conn:
-            result = await conn.execute(
-                "DELETE FROM posts WHERE id = $1 AND status IN ('draft', 'editing')", post_id
+            deleted_id = await conn.fetchval(
+                "DELETE FROM posts WHERE id = $1 AND status IN ('draft', 'editing') RETURNING id", post_id
             )
-            return result.split()[-1] != "0"
+            return deleted_id is not None
 
     @staticmethod
-    async def get_user_stats(user_id: int) -> Dict[str, Any]:
+    async def get_user_stats(user_id: int) -> Record:
         """Статистика постов пользователя"""
-        pool = await get_pool()
+        pool = await get_read_pool()
         async with pool.acquire() as conn:
             stats = await conn.fetchrow("""
                 SELECT 
@@ -142,4 +118,4 @@ class PostManager:
                     COALESCE(SUM(output_tokens), 0) AS total_output_tokens
                 FROM posts WHERE user_id = $1
             """, user_id)
-            return dict(stats) if stats else {}
+            return stats
@@ -1,43 +1,113 @@
 """Менеджер пользователей"""
 
+import asyncio
 import structlog
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any
-from database.db import get_pool
+from typing import Optional, Dict, Any, Set
+from asyncpg import Record
+from database.db import get_pool, add_listener
 from config.settings import config
+from utils.ttl_cache import TTLCache
 
 logger = structlog.get_logger()
 
+# Колонки пользователя, которые реально читают хэндлеры и проверки доступа
+USER_COLUMNS = (
+    "id, chat_id, is_subscribed, trial_expires_at, subscription_expires_at, "
+    "tokens_balance, tokens_used_total"
+)
+
+# Кэш строк пользователей по chat_id — сбрасывается при каждой записи
+_users_cache = TTLCache(maxsize=10_000, ttl=config.USER_CACHE_TTL)
+
+# Счётчик сбросов кэша (записи, NOTIFY, обрыв LISTEN) — чтение, во время
+# которого был любой сброс, не кладёт в кэш возможно устаревшую строку
+_users_generation = 0
+
+# Фоновые списания токенов — держим ссылки, чтобы задачи не собрал GC
+_pending_debits: Set[asyncio.Task] = set()
+
+
+async def _write_user(conn, chat_id: int, sql: str, *args) -> Any:
+    """
+    Все UPDATE пользователя идут через этот хелпер — он сбрасывает кэш.
+    sql — UPDATE ... WHERE chat_id = $1 RETURNING <колонка>;
+    None — строка не обновлена.
+    """
+    result = await conn.fetchval(sql, chat_id, *args)
+    _invalidate_user(chat_id)
+    return result
+
+
+def _invalidate_user(chat_id: int):
+    global _users_generation
+    _users_generation += 1
+    _users_cache.pop(chat_id)
+
+
+def _fill_user(chat_id: int, row: Record, generation: int):
+    """Положить строку в кэш, только если за время чтения не было сбросов"""
+    if _users_generation == generation:
+        _users_cache.set(chat_id, row)
+
+
+def _on_user_changed(conn, pid, channel, payload):
+    """NOTIFY users_changed от любого воркера — сбрасываем локальную копию"""
+    _invalidate_user(int(payload))
+
+
+def _on_listener_lost():
+    """Уведомления могли потеряться — локальным копиям больше нельзя верить"""
+    global _users_generation
+    _users_generation += 1
+    _users_cache.clear()
+
 
 class UserManager:
 
     @staticmethod
-    async def get_or_create(chat_id: int, username: str = None, first_name: str = None) -> Dict[str, Any]:
+    async def listen_changes():
+        """Подписать кэш пользователей на изменения из других воркеров"""
+        await add_listener("users_changed", _on_user_changed, on_lost=_on_listener_lost)
+
+    @staticmethod
+    async def get_or_create(chat_id: int, username: str = None, first_name: str = None) -> Record:
         """Получить или создать пользователя, при создании запустить триал"""
+        now = datetime.now(timezone.utc)
+        trial_expires = now + timedelta(days=config.TRIAL_DAYS)
+
+        generation = _users_generation
         pool = await get_pool()
         async with pool.acquire() as conn:
-            user = await conn.fetchrow("SELECT * FROM users WHERE chat_id = $1", chat_id)
-            if user:
-                return dict(user)
-
-            now = datetime.now(timezone.utc)
-            trial_expires = now + timedelta(days=config.TRIAL_DAYS)
-
-            user = await conn.fetchrow("""
+            # Один запрос на оба случая; xmax = 0 — строка только что вставлена
+            row = await conn.fetchrow(f"""
                 INSERT INTO users (chat_id, username, first_name, trial_started_at, trial_expires_at, tokens_balance)
                 VALUES ($1, $2, $3, $4, $5, $6)
-                RETURNING *
+                ON CONFLICT (chat_id) DO UPDATE
+                SET username = COALESCE(EXCLUDED.username, users.username),
+                    first_name = COALESCE(EXCLUDED.first_name, users.first_name)
+                RETURNING {USER_COLUMNS}, (xmax = 0) AS inserted
             """, chat_id, username, first_name, now, trial_expires, config.DEFAULT_TOKEN_LIMIT)
 
-            logger.info("👤 New user created with trial", chat_id=chat_id, trial_expires=trial_expires.isoformat())
-            return dict(user)
+            # Record неизменяем — кладём в кэш и отдаём без копирования
+            _fill_user(chat_id, row, generation)
+            if row["inserted"]:
+                logger.info("👤 New user created with trial", chat_id=chat_id, trial_expires=trial_expires.isoformat())
+            return row
 
     @staticmethod
-    async def get_by_chat_id(chat_id: int) -> Optional[Dict[str, Any]]:
+    async def get_by_chat_id(chat_id: int) -> Optional[Record]:
+        cached = _users_cache.get(chat_id)
+        if cached:
+            return cached
+
+        generation = _users_generation
         pool = await get_pool()
         async with pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM users WHERE chat_id = $1", chat_id)
-            return dict(row) if row else None
+            row = await conn.fetchrow(f"SELECT {USER_COLUMNS} FROM users WHERE chat_id = $1", chat_id)
+            if row:
+                _fill_user(chat_id, row, generation)
+            return row
 
     @staticmethod
     async def has_access(chat_id: int) -> bool:
@@ -45,7 +115,11 @@ class UserManager:
         user = await UserManager.get_by_chat_id(chat_id)
         if not user:
             return False
+        return UserManager.check_access(user)
 
+    @staticmethod
+    def check_access(user: Record) -> bool:
+        """То же, что has_access, но по уже полученной строке пользователя"""
         now = datetime.now(timezone.utc)
 
         # Подписка активна
@@ -72,7 +146,11 @@ class UserManager:
         user = await UserManager.get_by_chat_id(chat_id)
         if not user:
             return {"has_access": False, "reason": "not_found"}
+        return UserManager.build_access_info(user)
 
+    @staticmethod
+    def build_access_info(user: Record) -> Dict[str, Any]:
+        """То же, что get_access_info, но по уже полученной строке пользователя"""
         now = datetime.now(timezone.utc)
         trial_active = bool(user["trial_expires_at"] and user["trial_expires_at"] > now)
         sub_active = bool(user["is_subscribed"] and user["subscription_expires_at"] and user["subscription_expires_at"] > now)
@@ -98,29 +176,29 @@ class UserManager:
     @staticmethod
     async def activate_subscription(chat_id: int, months: int = 1) -> bool:
         """Активировать/продлить подписку с учётом триала"""
+        duration = timedelta(days=30 * months)
+
         pool = await get_pool()
         async with pool.acquire() as conn:
-            user = await conn.fetchrow("SELECT * FROM users WHERE chat_id = $1", chat_id)
-            if not user:
-                return False
-
-            now = datetime.now(timezone.utc)
-            duration = timedelta(days=30 * months)
-
-            # 1. Подписка уже активна — продлеваем от её конца
-            if user["subscription_expires_at"] and user["subscription_expires_at"] > now:
-                new_expires = user["subscription_expires_at"] + duration
-            # 2. Триал ещё активен — подписка начинается от конца триала
-            elif user["trial_expires_at"] and user["trial_expires_at"] > now:
-                new_expires = user["trial_expires_at"] + duration
-            # 3. Ничего нет — от текущего момента
-            else:
-                new_expires = now + duration
-
-            await conn.execute("""
-                UPDATE users SET is_subscribed = TRUE, subscription_expires_at = $2, updated_at = NOW()
+            # Новый срок считается в том же UPDATE — два параллельных платежа
+            # не прочитают одно и то же старое значение
+            new_expires = await _write_user(conn, chat_id, """
+                UPDATE users SET
+                    is_subscribed = TRUE,
+                    subscription_expires_at = CASE
+                        -- 1. Подписка уже активна — продлеваем от её конца
+                        WHEN subscription_expires_at > NOW() THEN subscription_expires_at + $2::interval
+                        -- 2. Триал ещё активен — подписка начинается от конца триала
+                        WHEN trial_expires_at > NOW() THEN trial_expires_at + $2::interval
+                        -- 3. Ничего нет — от текущего момента
+                        ELSE NOW() + $2::interval
+                    END,
+                    updated_at = NOW()
                 WHERE chat_id = $1
-            """, chat_id, new_expires)
+                RETURNING subscription_expires_at
+            """, duration)
+            if new_expires is None:
+                return False
 
             logger.info("💳 Subscription activated", chat_id=chat_id, expires=new_expires.isoformat())
             return True
@@ -130,11 +208,12 @@ class UserManager:
         """Добавить токены пользователю"""
         pool = await get_pool()
         async with pool.acquire() as conn:
-            result = await conn.execute("""
+            balance = await _write_user(conn, chat_id, """
                 UPDATE users SET tokens_balance = tokens_balance + $2, updated_at = NOW()
                 WHERE chat_id = $1
-            """, chat_id, amount)
-            success = result.split()[-1] != "0"
+                RETURNING tokens_balance
+            """, amount)
+            success = balance is not None
             if success:
                 logger.info("🪙 Tokens added", chat_id=chat_id, amount=amount)
             return success
@@ -144,14 +223,35 @@ class UserManager:
         """Списать токены (проверяет баланс)"""
         pool = await get_pool()
         async with pool.acquire() as conn:
-            result = await conn.execute("""
-                UPDATE users 
-                SET tokens_balance = tokens_balance - $2, 
+            balance = await _write_user(conn, chat_id, """
+                UPDATE users
+                SET tokens_balance = tokens_balance - $2,
                     tokens_used_total = tokens_used_total + $2,
                     updated_at = NOW()
                 WHERE chat_id = $1 AND tokens_balance >= $2
-            """, chat_id, amount)
-            success = result.split()[-1] != "0"
+                RETURNING tokens_balance
+            """, amount)
+            success = balance is not None
             if not success:
                 logger.warning("⚠️ Not enough tokens", chat_id=chat_id, requested=amount)
             return success
+
+    @staticmethod
+    def spend_tokens_later(chat_id: int, amount: int):
+        """Списать токены в фоне — ответ пользователю не ждёт записи в БД"""
+        task = asyncio.create_task(UserManager._spend_tokens_logged(chat_id, amount))
+        _pending_debits.add(task)
+        task.add_done_callback(_pending_debits.discard)
+
+    @staticmethod
+    async def _spend_tokens_logged(chat_id: int, amount: int):
+        try:
+            await UserManager.spend_tokens(chat_id, amount)
+        except Exception as e:
+            logger.error("❌ Token debit failed", chat_id=chat_id, amount=amount, error=str(e))
+
+    @staticmethod
+    async def flush_pending_debits():
+        """Дождаться фоновых списаний (при остановке, до закрытия пула)"""
+        if _pending_debits:
+            await asyncio.gather(*_pending_debits)
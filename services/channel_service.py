@@ -1,10 +1,9 @@
 """Сервис работы с каналами — проверка прав, публикация"""
 
-import json
 import structlog
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Iterator
 from aiogram import Bot
-from aiogram.types import InputMediaPhoto, InputMediaVideo, InputMediaAnimation
+from aiogram.types import Message, InputMediaPhoto, InputMediaVideo
 from utils.html_sanitizer import sanitize_html
 
 logger = structlog.get_logger()
@@ -14,6 +13,20 @@ CAPTION_MAX_LENGTH = 1024
 # Telegram ограничивает текстовые сообщения до 4096 символов
 MESSAGE_MAX_LENGTH = 4096
 
+# Одиночные медиа: тип -> (метод Bot, имя параметра с file_id)
+SEND_METHODS = {
+    "photo": ("send_photo", "photo"),
+    "video": ("send_video", "video"),
+    "animation": ("send_animation", "animation"),
+    "document": ("send_document", "document"),
+}
+
+# Элементы альбома: тип -> класс InputMedia (остальные типы в альбом не берём)
+_MEDIA_GROUP_CLASSES = {
+    "photo": InputMediaPhoto,
+    "video": InputMediaVideo,
+}
+
 
 async def verify_bot_is_admin(bot: Bot, channel_id: int) -> Dict[str, Any]:
     """Проверить что бот — администратор канала с правом публикации"""
@@ -38,29 +51,107 @@ async def verify_bot_is_admin(bot: Bot, channel_id: int) -> Dict[str, Any]:
         return {"is_admin": False, "can_post": False, "error": str(e)}
 
 
-async def _send_long_text(bot: Bot, channel_id: int, text: str, parse_mode: str = "HTML") -> Any:
-    """Отправка длинного текста с разбиением на части (если > 4096 символов)."""
-    if parse_mode == "HTML":
-        text = sanitize_html(text)
+def _split_text(text: str, limit: int) -> Iterator[str]:
+    """Нарезать текст на части до limit символов, по возможности по переносу строки"""
+    start, end = 0, len(text)
+    while start < end:
+        if end - start <= limit:
+            yield text[start:]
+            return
+        cut_pos = text.rfind("\n", start, start + limit)
+        if cut_pos <= start:
+            cut_pos = start + limit
+        yield text[start:cut_pos]
+        # Переносы на стыке частей отбрасываем
+        start = cut_pos
+        while start < end and text[start] == "\n":
+            start += 1
+
 
+async def send_long_text(
+    bot: Bot,
+    chat_id: int,
+    text: str,
+    reply_markup=None,
+    parse_mode: str = "HTML",
+) -> Optional[Message]:
+    """
+    Отправка длинного текста с разбиением на части (если > 4096 символов).
+    reply_markup прикрепляется только к последнему сообщению.
+    text должен быть уже санитизирован вызывающим — повторно не чистим.
+    """
     if len(text) <= MESSAGE_MAX_LENGTH:
-        return await bot.send_message(channel_id, text, parse_mode=parse_mode)
+        return await bot.send_message(
+            chat_id, text, reply_markup=reply_markup, parse_mode=parse_mode,
+        )
+
+    # Части отправляются по мере нарезки; держим одну в запасе,
+    # чтобы reply_markup ушёл только с последней
+    parts = _split_text(text, MESSAGE_MAX_LENGTH)
+    part = next(parts)
+    for next_part in parts:
+        await bot.send_message(chat_id, part, parse_mode=parse_mode)
+        part = next_part
+    return await bot.send_message(
+        chat_id, part, reply_markup=reply_markup, parse_mode=parse_mode,
+    )
+
+
+async def send_single_media(
+    bot: Bot,
+    chat_id: int,
+    text: str,
+    media_info: Dict[str, Any],
+    reply_markup=None,
+) -> Message:
+    """
+    Отправка одиночного медиа (тип из SEND_METHODS) с подписью.
+    Если caption > 1024 — медиа без подписи, текст отдельно.
+    """
+    method_name, param_name = SEND_METHODS[media_info["type"]]
+    method = getattr(bot, method_name)
+
+    if len(text) <= CAPTION_MAX_LENGTH:
+        return await method(
+            chat_id,
+            **{param_name: media_info["file_id"]},
+            caption=text,
+            reply_markup=reply_markup,
+            parse_mode="HTML",
+        )
 
-    parts = []
-    while text:
-        if len(text) <= MESSAGE_MAX_LENGTH:
-            parts.append(text)
-            break
-        cut_pos = text.rfind("\n", 0, MESSAGE_MAX_LENGTH)
-        if cut_pos <= 0:
-            cut_pos = MESSAGE_MAX_LENGTH
-        parts.append(text[:cut_pos])
-        text = text[cut_pos:].lstrip("\n")
+    # Медиа без подписи + текст отдельно
+    await method(chat_id, **{param_name: media_info["file_id"]})
+    return await send_long_text(bot, chat_id, text, reply_markup=reply_markup)
 
-    last_msg = None
-    for part in parts:
-        last_msg = await bot.send_message(channel_id, part, parse_mode=parse_mode)
-    return last_msg
+
+def build_media_group(items: List[Dict[str, Any]], caption_text: str) -> Tuple[list, bool]:
+    """
+    Собрать media group для альбома.
+    Возвращает (media_group, use_caption); при use_caption=False текст нужно отправить отдельно.
+    """
+    use_caption = len(caption_text) <= CAPTION_MAX_LENGTH
+    # Подпись только у первого элемента — считаем её один раз, а не на каждой итерации
+    first_caption, first_parse = (caption_text, "HTML") if use_caption else (None, None)
+
+    # Отсеиваем неподходящие элементы заранее: один битый элемент
+    # иначе роняет весь send_media_group, а подпись уходит в пустоту
+    normalized = [
+        (_MEDIA_GROUP_CLASSES.get(item.get("type", "photo")), item.get("file_id"))
+        for item in items
+    ]
+    normalized = [(media_cls, file_id) for media_cls, file_id in normalized if media_cls and file_id]
+
+    media_group = [
+        media_cls(
+            media=file_id,
+            caption=first_caption if i == 0 else None,
+            parse_mode=first_parse if i == 0 else None,
+        )
+        for i, (media_cls, file_id) in enumerate(normalized)
+    ]
+
+    return media_group, use_caption
 
 
 async def publish_post(
@@ -80,44 +171,20 @@ async def publish_post(
         # Санитизация
         text = sanitize_html(text)
 
-        if not media_info:
-            msg = await _send_long_text(bot, channel_id, text)
-            return {"success": True, "message_id": msg.message_id}
-        
-        media_type = media_info.get("type")
-        
+        media_type = media_info.get("type") if media_info else None
+
         if media_type == "album":
             return await _publish_album(bot, channel_id, text, media_info)
-        
+
         # === ОДИНОЧНЫЕ МЕДИА ===
-        send_map = {
-            "photo": ("send_photo", "photo"),
-            "video": ("send_video", "video"),
-            "animation": ("send_animation", "animation"),
-            "document": ("send_document", "document"),
-        }
-        
-        if media_type in send_map:
-            method_name, param_name = send_map[media_type]
-            method = getattr(bot, method_name)
-            
-            if len(text) <= CAPTION_MAX_LENGTH:
-                msg = await method(
-                    channel_id,
-                    **{param_name: media_info["file_id"]},
-                    caption=text,
-                    parse_mode="HTML",
-                )
-                return {"success": True, "message_id": msg.message_id}
-            else:
-                # Медиа без подписи + текст отдельно
-                await method(channel_id, **{param_name: media_info["file_id"]})
-                msg = await _send_long_text(bot, channel_id, text)
-                return {"success": True, "message_id": msg.message_id}
-        
-        # Неизвестный тип — только текст
-        logger.warning("⚠️ Unknown media type, sending text only", media_type=media_type)
-        msg = await _send_long_text(bot, channel_id, text)
+        if media_type in SEND_METHODS:
+            msg = await send_single_media(bot, channel_id, text, media_info)
+        else:
+            # Без медиа или неизвестный тип — только текст
+            if media_info:
+                logger.warning("⚠️ Unknown media type, sending text only", media_type=media_type)
+            msg = await send_long_text(bot, channel_id, text)
+
         return {"success": True, "message_id": msg.message_id}
     
     except Exception as e:
@@ -137,26 +204,7 @@ async def _publish_album(
         if not items:
             return {"success": False, "error": "Empty album"}
         
-        use_caption = len(caption_text) <= CAPTION_MAX_LENGTH
-        
-        media_group = []
-        for i, item in enumerate(items):
-            item_type = item.get("type", "photo")
-            file_id = item["file_id"]
-            cap = caption_text if (i == 0 and use_caption) else None
-            
-            if item_type == "photo":
-                media_group.append(InputMediaPhoto(
-                    media=file_id,
-                    caption=cap,
-                    parse_mode="HTML" if cap else None,
-                ))
-            elif item_type == "video":
-                media_group.append(InputMediaVideo(
-                    media=file_id,
-                    caption=cap,
-                    parse_mode="HTML" if cap else None,
-                ))
+        media_group, use_caption = build_media_group(items, caption_text)
         
         if not media_group:
             return {"success": False, "error": "No valid media items"}
@@ -165,7 +213,7 @@ async def _publish_album(
         
         # Текст отдельно если не влез в caption
         if not use_caption:
-            await _send_long_text(bot, channel_id, caption_text)
+            await send_long_text(bot, channel_id, caption_text)
         
         return {
             "success": True,
@@ -0,0 +1,17 @@
+"""Общий клиент OpenAI для всех сервисов (генерация, Whisper)"""
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DEFAULT_TIMEOUT
+from config.settings import config
+
+# Один клиент на процесс — генерация и транскрипция делят пул соединений
+# к api.openai.com; keepalive_expiry держит прогретые TLS-соединения
+# между запросами пользователей (по умолчанию у httpx всего 5 секунд).
+# Таймауты и ретраи — как у SDK: длинные генерации не обрываются на чтении
+client = AsyncOpenAI(
+    api_key=config.OPENAI_API_KEY,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30),
+        timeout=DEFAULT_TIMEOUT,
+    ),
+)
@@ -1,13 +1,21 @@
 """OpenAI сервис — генерация и рерайт контента через GPT-4o-mini"""
 
+import asyncio
+import functools
 import structlog
 from typing import Dict, Any, List, Optional
-from openai import AsyncOpenAI
 from config.settings import config
+from services.openai_client import client
 
 logger = structlog.get_logger()
 
-client = AsyncOpenAI(api_key=config.OPENAI_API_KEY)
+# Сколько последних пар "правка — ответ" отправлять в модель при редактировании.
+# Текущий текст поста и так приходит в промпте, старые правки только раздувают input
+MAX_HISTORY_TURNS = 8
+
+# Не больше N одновременных запросов из процесса: всплеск пользователей
+# ждёт здесь, а не ловит 429 и повторы SDK
+_request_semaphore = asyncio.Semaphore(config.OPENAI_MAX_CONCURRENCY)
 
 
 SYSTEM_PROMPT_BASE = """Ты — профессиональный контент-менеджер для Telegram-каналов.
@@ -22,6 +30,15 @@ SYSTEM_PROMPT_BASE = """Ты — профессиональный контент
 - Не добавляй эмодзи чрезмерно"""
 
 
+@functools.lru_cache(maxsize=256)
+def _build_system_message(agent_instructions: str) -> str:
+    """
+    Системный промпт агента. Инструкции агента меняются редко — собираем строку один раз.
+    Статичный SYSTEM_PROMPT_BASE идёт первым: одинаковый префикс попадает в prompt caching OpenAI.
+    """
+    return f"{SYSTEM_PROMPT_BASE}\n\nИНСТРУКЦИИ АВТОРА КАНАЛА:\n{agent_instructions}"
+
+
 async def generate_content(
     user_prompt: str,
     agent_instructions: str,
@@ -36,26 +53,28 @@ async def generate_content(
     """
     model = model or config.OPENAI_MODEL
 
-    system_message = f"{SYSTEM_PROMPT_BASE}\n\nИНСТРУКЦИИ АВТОРА КАНАЛА:\n{agent_instructions}"
-
-    messages = [{"role": "system", "content": system_message}]
+    messages = [{"role": "system", "content": _build_system_message(agent_instructions)}]
 
     # Добавляем историю диалога (для редактирования)
     if conversation_history:
-        messages.extend(conversation_history)
+        messages.extend(conversation_history[-MAX_HISTORY_TURNS * 2:])
 
     messages.append({"role": "user", "content": user_prompt})
 
     try:
-        response = await client.chat.completions.create(
-            model=model,
-            messages=messages,
-            max_tokens=2000,
-            temperature=0.7,
-        )
+        async with _request_semaphore:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=config.OPENAI_MAX_TOKENS,
+                temperature=0.7,
+            )
 
         choice = response.choices[0]
         generated_text = choice.message.content.strip()
+        if choice.finish_reason == "length":
+            # Ответ упёрся в OPENAI_MAX_TOKENS — сигнал, что потолок занижен
+            logger.warning("⚠️ Generation truncated by max_tokens", max_tokens=config.OPENAI_MAX_TOKENS)
 
         usage = response.usage
         input_tokens = usage.prompt_tokens if usage else 0
@@ -1,29 +1,34 @@
 """Глобальный буфер для сбора медиагрупп (альбомов) на уровне webhook"""
 
-import asyncio
 import structlog
 from typing import Dict, List, Optional
 from aiogram.types import Message
+from utils.ttl_cache import TTLCache
 
 logger = structlog.get_logger()
 
-# Хранилище собранных альбомов: {media_group_id: [Message, ...]}
-_collected_albums: Dict[str, List[Message]] = {}
+ALBUM_WAIT_SECONDS = 2.0
 
-# Буфер для сбора: {media_group_id: [Message, ...]}
-_pending_buffer: Dict[str, List[Message]] = {}
+# Хранилище собранных альбомов: {media_group_id: [Message, ...]}.
+# AlbumMiddleware висит только на роутере контента — если альбом ушёл в другой
+# роутер или ни в один хэндлер, его никто не заберёт, поэтому записи живут ограниченно
+_collected_albums = TTLCache(maxsize=1_000, ttl=60)
 
-ALBUM_WAIT_SECONDS = 2.0
+# Буфер для сбора: {media_group_id: [Message, ...]}.
+# Каждую группу забирает flush_buffer из задачи, запущенной на первом сообщении
+_pending_buffer: Dict[str, List[Message]] = {}
 
 
 def store_album(media_group_id: str, messages: List[Message]):
     """Сохранить собранный альбом для последующего получения в middleware"""
-    _collected_albums[media_group_id] = messages
+    _collected_albums.set(media_group_id, messages)
 
 
 def retrieve_album(media_group_id: str) -> Optional[List[Message]]:
     """Получить и удалить собранный альбом (вызывается из middleware)"""
-    return _collected_albums.pop(media_group_id, None)
+    messages = _collected_albums.get(media_group_id)
+    _collected_albums.pop(media_group_id)
+    return messages
 
 
 def add_to_buffer(media_group_id: str, message: Message) -> bool:
@@ -31,17 +36,16 @@ def add_to_buffer(media_group_id: str, message: Message) -> bool:
     Добавить сообщение в буфер сбора.
     Возвращает True если это ПЕРВОЕ сообщение группы (нужно запустить таймер).
     """
-    is_first = media_group_id not in _pending_buffer
-    if is_first:
-        _pending_buffer[media_group_id] = []
-    _pending_buffer[media_group_id].append(message)
+    # Без await внутри — в рамках event loop проверка и вставка атомарны, lock не нужен
+    messages = _pending_buffer.setdefault(media_group_id, [])
+    messages.append(message)
 
     logger.debug("📸 Album message buffered",
                  media_group_id=media_group_id,
                  message_id=message.message_id,
-                 buffered=len(_pending_buffer[media_group_id]))
+                 buffered=len(messages))
 
-    return is_first
+    return len(messages) == 1
 
 
 def flush_buffer(media_group_id: str) -> List[Message]:
@@ -13,6 +13,38 @@ ALLOWED_TAGS = {
 
 # Паттерн для поиска HTML тегов
 _TAG_PATTERN = re.compile(r"<(/?)(\w[\w-]*)((?:\s+[^>]*)?)>")
+# Атрибуты, которые сохраняем у <a> и <pre>
+_HREF_PATTERN = re.compile(r'href\s*=\s*["\']([^"\']*)["\']')
+_LANGUAGE_PATTERN = re.compile(r'language\s*=\s*["\']([^"\']*)["\']')
+
+# Имя тега -> каноническое имя. Модель почти всегда пишет теги строчными,
+# поэтому .lower() зовём только если точного совпадения нет
+_CANONICAL_TAGS = {tag: tag for tag in ALLOWED_TAGS}
+
+
+def _replace_tag(match) -> str:
+    slash = match.group(1)       # "/" или ""
+    raw_name = match.group(2)    # имя тега
+    tag_name = _CANONICAL_TAGS.get(raw_name) or _CANONICAL_TAGS.get(raw_name.lower())
+
+    if tag_name is None:
+        # Неизвестный тег — удаляем (оставляем содержимое)
+        return ""
+
+    # Атрибуты разбираем только у открывающих <a> и <pre>
+    if not slash:
+        # Для тега <a> сохраняем href
+        if tag_name == "a":
+            href_match = _HREF_PATTERN.search(match.group(3))
+            if href_match:
+                return f'<a href="{href_match.group(1)}">'
+            return ""  # <a> без href — удаляем
+        # Для <pre> сохраняем language
+        if tag_name == "pre":
+            lang_match = _LANGUAGE_PATTERN.search(match.group(3))
+            if lang_match:
+                return f'<pre language="{lang_match.group(1)}">'
+    return f"<{slash}{tag_name}>"
 
 
 def sanitize_html(text: str) -> str:
@@ -23,31 +55,8 @@ def sanitize_html(text: str) -> str:
     - Удаляет неизвестные теги (оставляя содержимое)
     - Экранирует незакрытые < > которые могут сломать парсинг
     """
-    if not text:
+    # Без "<" тегов нет — обычный текст отдаём как есть, минуя regex
+    if not text or "<" not in text:
         return text
 
-    def replace_tag(match):
-        slash = match.group(1)       # "/" или ""
-        tag_name = match.group(2).lower()  # имя тега
-        attrs = match.group(3)       # атрибуты
-
-        if tag_name in ALLOWED_TAGS:
-            # Для тега <a> сохраняем href
-            if tag_name == "a" and not slash:
-                href_match = re.search(r'href\s*=\s*["\']([^"\']*)["\']', attrs)
-                if href_match:
-                    return f'<a href="{href_match.group(1)}">'
-                return ""  # <a> без href — удаляем
-            # Для <pre> сохраняем language
-            if tag_name == "pre" and not slash:
-                lang_match = re.search(r'language\s*=\s*["\']([^"\']*)["\']', attrs)
-                if lang_match:
-                    return f'<pre language="{lang_match.group(1)}">'
-            return f"<{slash}{tag_name}>"
-        else:
-            # Неизвестный тег — удаляем (оставляем содержимое)
-            return ""
-
-    result = _TAG_PATTERN.sub(replace_tag, text)
-
-    return result
+    return _TAG_PATTERN.sub(_replace_tag, text)
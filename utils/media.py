@@ -48,17 +48,24 @@ def extract_links(message: Message) -> str:
     """Извлечь все ссылки из сообщения для передачи в prompt"""
     text = message.text or message.caption or ""
     entities = message.entities or message.caption_entities or []
-    
+    if not entities:
+        return ""
+
+    # Telegram считает offset/length в UTF-16 единицах, а Python — в code points:
+    # после эмодзи срезы по str съезжают. Кодируем текст один раз и режем байты
+    utf16 = text.encode("utf-16-le")
+
+    def _entity_text(entity) -> str:
+        return utf16[entity.offset * 2:(entity.offset + entity.length) * 2].decode("utf-16-le")
+
     links = []
     for entity in entities:
         if entity.type == "url":
-            url = text[entity.offset:entity.offset + entity.length]
-            links.append(url)
+            links.append(_entity_text(entity))
         elif entity.type == "text_link":
-            link_text = text[entity.offset:entity.offset + entity.length]
-            links.append(f'{link_text} -> {entity.url}')
+            links.append(f'{_entity_text(entity)} -> {entity.url}')
     
-    return "\n".join(links) if links else ""
+    return "\n".join(links)
 
 
 def get_text(message: Message) -> str:
@@ -0,0 +1,46 @@
+"""Простой in-process кэш с TTL для редко меняющихся данных"""
+
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Кэш {key: value} с временем жизни записей.
+
+    - Просроченные записи удаляются при обращении
+    - При переполнении вытесняется самая старая запись
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Получить значение или None, если записи нет или она просрочена"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        """Сохранить значение (ttl переопределяет время жизни по умолчанию)"""
+        if key not in self._data and len(self._data) >= self.maxsize:
+            # dict хранит порядок вставки — первая запись самая старая
+            self._data.pop(next(iter(self._data)))
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+
+    def pop(self, key: Hashable):
+        """Инвалидировать запись"""
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)